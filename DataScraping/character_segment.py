@@ -11,12 +11,19 @@ from transformers.models.sam3 import Sam3Processor, Sam3Model
 from huggingface_hub import login, whoami
 
 class CharacterSegmenter:
+    DTYPES = {
+        "fp32": torch.float32,
+        "bf16": torch.bfloat16,
+        "fp16": torch.float16
+    }
+    
     def __init__(
         self, 
         output_dir="character_crops",
         model_name="facebook/sam3",
         device=None,
-        hf_token=None
+        hf_token=None,
+        dtype="fp32"
     ):
         """
         Initialize the character segmenter with SAM3
@@ -25,6 +32,7 @@ class CharacterSegmenter:
             output_dir: Directory to store cropped character images
             model_name: Hugging Face model name
             device: Device to use ('cuda' or 'cpu'), auto-detect if None
+            dtype: Weight/compute precision ('fp32', 'bf16' or 'fp16'), half precision needs CUDA
         """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
@@ -37,6 +45,16 @@ class CharacterSegmenter:
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.hf_token = hf_token
         
+        self.precision = dtype if dtype in self.DTYPES else "fp32"
+        if self.precision != "fp32" and self.device != "cuda":
+            print(f"⚠ {self.precision} requested on {self.device}, using fp32")
+            self.precision = "fp32"
+        elif self.precision == "bf16" and not torch.cuda.is_bf16_supported():
+            # Pre-Ampere GPUs have no native bf16
+            print("⚠ bf16 requested but not supported by this GPU, using fp16")
+            self.precision = "fp16"
+        self.dtype = self.DTYPES[self.precision]
+        
         # Setup SAM3
         self.processor = None
         self.model = None
@@ -87,15 +105,67 @@ class CharacterSegmenter:
         try:
             # Load processor and model specifically for SAM3
             self.processor = Sam3Processor.from_pretrained(self.model_name)
-            self.model = Sam3Model.from_pretrained(self.model_name).to(self.device)
+            self.model = Sam3Model.from_pretrained(
+                self.model_name,
+                torch_dtype=self.dtype
+            ).to(self.device)
             self.model.eval()
             
-            print(f"✓ SAM3 model loaded on {self.device}")
+            print(f"✓ SAM3 model loaded on {self.device} ({self.precision})")
             
         except Exception as e:
             print(f"✗ Error loading SAM3: {e}")
             print("Note: Make sure you are authenticated with Hugging Face")
     
+    def compile_model(self, mode="reduce-overhead", batch_size=1):
+        """
+        Compile the SAM3 model with torch.compile and run warmup passes
+        
+        Args:
+            mode: torch.compile mode
+            batch_size: Largest batch segment_images_with_text_prompt will be called with
+            
+        Returns:
+            True if the compiled model is in use, False if it stays eager
+        """
+        if self.model is None or self.device != "cuda":
+            return False
+        
+        major = int(torch.__version__.split(".")[0])
+        if major < 2 or not hasattr(torch, "compile"):
+            return False
+        
+        eager_model = self.model
+        try:
+            self.model = torch.compile(eager_model, mode=mode, fullgraph=False)
+            
+            # Warmup so the first real batch doesn't pay the compile cost.
+            # Size-1 batches are specialized separately; a second batch size
+            # >1 makes dynamo treat the batch dimension as dynamic, so every
+            # partial batch reuses that graph
+            blank = Image.new("RGB", (1024, 1024))
+            warmup_sizes = [1]
+            if batch_size > 1:
+                warmup_sizes.append(batch_size)
+            if batch_size > 2:
+                warmup_sizes.append(batch_size - 1)
+            for size in warmup_sizes:
+                self.segment_images_with_text_prompt([blank] * size, "character")
+        except Exception as e:
+            print(f"⚠ torch.compile failed, using eager model: {e}")
+            self.model = eager_model
+            return False
+        
+        print("✓ SAM3 model compiled")
+        return True
+    
+    @property
+    def model_tag(self):
+        """Identifies the model and precision that produced a result"""
+        if self.precision == "fp32":
+            return self.model_name
+        return f"{self.model_name}@{self.precision}"
+    
     def segment_with_text_prompt(self, image, prompt="character", threshold=0.5):
         """
         Segment using text prompt and post-process results
@@ -108,12 +178,26 @@ class CharacterSegmenter:
         Returns:
             Dictionary containing 'masks', 'boxes', 'scores'
         """
+        return self.segment_images_with_text_prompt([image], prompt, threshold)[0]
+    
+    def segment_images_with_text_prompt(self, images, prompt="character", threshold=0.5):
+        """
+        Segment several images with one batched forward pass
+        
+        Args:
+            images: List of PIL Images
+            prompt: Text prompt for segmentation
+            threshold: Confidence threshold
+            
+        Returns:
+            List of dictionaries containing 'masks', 'boxes', 'scores', one per image
+        """
         # Prepare inputs with text prompt
         inputs = self.processor(
-            images=image,
-            text=prompt,
+            images=images,
+            text=[prompt] * len(images),
             return_tensors="pt"
-        ).to(self.device)
+        ).to(self.device, dtype=self.dtype)
         
         print("Successfully prepared imputs")
 
@@ -121,21 +205,24 @@ class CharacterSegmenter:
             outputs = self.model(**inputs)
         
         # Use the correct post-processing method for SAM3
-        results = self.processor.post_process_instance_segmentation(
+        batch_results = self.processor.post_process_instance_segmentation(
             outputs,
             threshold=threshold,
             mask_threshold=0.5,
             target_sizes=inputs.get("original_sizes").tolist()
-        )[0]
+        )
         
         print("Segmentation result obtained")
 
         # Move tensors to CPU and convert to numpy for easier downstream processing
-        return {
-            "masks": results["masks"].cpu().numpy(), # Shape: (N, H, W) bool
-            "boxes": results["boxes"].cpu().numpy(), # Shape: (N, 4) xyxy
-            "scores": results["scores"].cpu().numpy() # Shape: (N,)
-        }
+        return [
+            {
+                "masks": results["masks"].cpu().numpy(), # Shape: (N, H, W) bool
+                "boxes": results["boxes"].float().cpu().numpy(), # Shape: (N, 4) xyxy
+                "scores": results["scores"].float().cpu().numpy() # Shape: (N,)
+            }
+            for results in batch_results
+        ]
 
     def segment_automatic(self, image):
         """
@@ -147,14 +234,33 @@ class CharacterSegmenter:
         Returns:
             List of (mask, bbox, score) tuples
         """
-        width, height = image.size
-        all_masks = []
-        
         print("  Running text-based segmentation...")
         try:
             # Get processed results directly
             results = self.segment_with_text_prompt(image, "character", threshold=0.4)
+        except Exception as e:
+            print(f"  Warning: Text-based segmentation failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results = None
+        
+        return self.filter_segmentation(results, image.size)
+    
+    def filter_segmentation(self, results, image_size):
+        """
+        Turn raw segmentation results into filtered character masks
+        
+        Args:
+            results: Dictionary from segment_with_text_prompt (or None)
+            image_size: (width, height) of the source image
             
+        Returns:
+            List of (mask, bbox, score) tuples
+        """
+        width, height = image_size
+        all_masks = []
+        
+        if results is not None:
             masks = results["masks"]
             boxes = results["boxes"]
             scores = results["scores"]
@@ -172,11 +278,6 @@ class CharacterSegmenter:
                 # The 'filter_masks' function expects (mask, score).
                 
                 all_masks.append((mask, score, bbox))
-                
-        except Exception as e:
-            print(f"  Warning: Text-based segmentation failed: {e}")
-            import traceback
-            traceback.print_exc()
 
         # Remove duplicate/overlapping masks
         # Note: filter_masks currently expects (mask, score), we need to adapt it 
@@ -241,6 +342,77 @@ class CharacterSegmenter:
         union = np.logical_or(mask1, mask2).sum()
         return intersection / union if union > 0 else 0
     
+    def get_existing_crops(self, image_id):
+        """
+        Return the crops of a previous segmentation if they are all still on disk
+        
+        Args:
+            image_id: Stem of the source image
+            
+        Returns:
+            List of crop paths, or None if the image must be segmented
+        """
+        if image_id in self.metadata:
+            print(f"⊙ Image {image_id} already segmented")
+            existing_crops = self.metadata[image_id].get('character_crops', [])
+            if all(Path(crop).exists() for crop in existing_crops):
+                return existing_crops
+        return None
+    
+    def save_crops(self, image_path, image, masks_data):
+        """
+        Crop, save and record the characters found in an image
+        
+        Args:
+            image_path: Path to the source image
+            image: Source PIL Image (RGB)
+            masks_data: List of (mask, bbox, score) tuples
+            
+        Returns:
+            List of paths to cropped character images
+        """
+        image_path = Path(image_path)
+        image_id = image_path.stem
+        width, height = image.size
+        
+        print(f"  Found {len(masks_data)} potential characters")
+        
+        # Crop each character
+        character_images = []
+        for idx, (mask, bbox, score) in enumerate(masks_data):
+            # Extract bounding box [x, y, w, h]
+            x, y, box_w, box_h = bbox
+            x_min, y_min = x, y
+            x_max, y_max = x + box_w, y + box_h
+            
+            # Add padding
+            padding = 10
+            x_min = max(0, x_min - padding)
+            y_min = max(0, y_min - padding)
+            x_max = min(width, x_max + padding)
+            y_max = min(height, y_max + padding)
+            
+            # Crop image
+            cropped = image.crop((x_min, y_min, x_max, y_max))
+            
+            # Save cropped character
+            output_path = self.output_dir / f"{image_id}_char_{idx:02d}.png"
+            cropped.save(output_path)
+            character_images.append(str(output_path))
+            print(f"  ✓ Saved character {idx}: {output_path.name} (score: {score:.3f})")
+        
+        # Save metadata
+        self.metadata[image_id] = {
+            'source_image': str(image_path),
+            'character_count': len(character_images),
+            'character_crops': character_images,
+            'method': 'sam3_auto'
+        }
+        self.save_metadata()
+        
+        print(f"✓ Segmented {len(character_images)} characters from {image_id}")
+        return character_images
+    
     def segment_image(self, image_path, force=False):
         """
         Segment characters from a single image
@@ -253,13 +425,11 @@ class CharacterSegmenter:
             List of paths to cropped character images
         """
         image_path = Path(image_path)
-        image_id = image_path.stem
         
         # Check if already processed
-        if not force and image_id in self.metadata:
-            print(f"⊙ Image {image_id} already segmented")
-            existing_crops = self.metadata[image_id].get('character_crops', [])
-            if all(Path(crop).exists() for crop in existing_crops):
+        if not force:
+            existing_crops = self.get_existing_crops(image_path.stem)
+            if existing_crops is not None:
                 return existing_crops
         
         print(f"\nSegmenting: {image_path}")
@@ -271,48 +441,11 @@ class CharacterSegmenter:
         try:
             # Load image
             image = Image.open(image_path).convert("RGB")
-            width, height = image.size
             
             # Run automatic segmentation
             masks_data = self.segment_automatic(image)
             
-            print(f"  Found {len(masks_data)} potential characters")
-            
-            # Crop each character
-            character_images = []
-            for idx, (mask, bbox, score) in enumerate(masks_data):
-                # Extract bounding box [x, y, w, h]
-                x, y, box_w, box_h = bbox
-                x_min, y_min = x, y
-                x_max, y_max = x + box_w, y + box_h
-                
-                # Add padding
-                padding = 10
-                x_min = max(0, x_min - padding)
-                y_min = max(0, y_min - padding)
-                x_max = min(width, x_max + padding)
-                y_max = min(height, y_max + padding)
-                
-                # Crop image
-                cropped = image.crop((x_min, y_min, x_max, y_max))
-                
-                # Save cropped character
-                output_path = self.output_dir / f"{image_id}_char_{idx:02d}.png"
-                cropped.save(output_path)
-                character_images.append(str(output_path))
-                print(f"  ✓ Saved character {idx}: {output_path.name} (score: {score:.3f})")
-            
-            # Save metadata
-            self.metadata[image_id] = {
-                'source_image': str(image_path),
-                'character_count': len(character_images),
-                'character_crops': character_images,
-                'method': 'sam3_auto'
-            }
-            self.save_metadata()
-            
-            print(f"✓ Segmented {len(character_images)} characters from {image_id}")
-            return character_images
+            return self.save_crops(image_path, image, masks_data)
             
         except Exception as e:
             print(f"✗ Error segmenting {image_path}: {e}")
@@ -320,8 +453,64 @@ class CharacterSegmenter:
             traceback.print_exc()
             return []
     
-    def segment_batch(self, image_paths, force=False):
-        """Segment characters from multiple images"""
+    def segment_images(self, image_paths, force=False):
+        """
+        Segment characters from several images with one batched forward pass
+        
+        Args:
+            image_paths: Paths to the image files
+            force: Force re-segmentation even if already processed
+            
+        Returns:
+            List of crop path lists, in the same order as image_paths
+        """
+        image_paths = [Path(p) for p in image_paths]
+        results = [None] * len(image_paths)
+        
+        # Check which images were already processed
+        pending = []
+        for i, image_path in enumerate(image_paths):
+            existing_crops = None if force else self.get_existing_crops(image_path.stem)
+            if existing_crops is not None:
+                results[i] = existing_crops
+            else:
+                pending.append(i)
+        
+        if not pending:
+            return results
+        
+        if self.model is None or self.processor is None:
+            print("✗ SAM3 model not loaded")
+            for i in pending:
+                results[i] = []
+            return results
+        
+        print(f"\nSegmenting batch of {len(pending)} images")
+        
+        try:
+            images = [Image.open(image_paths[i]).convert("RGB") for i in pending]
+            batch_results = self.segment_images_with_text_prompt(images, "character", threshold=0.4)
+        except Exception as e:
+            # e.g. out of memory: retry one image at a time
+            print(f"  Warning: Batched segmentation failed, falling back to single images: {e}")
+            for i in pending:
+                results[i] = self.segment_image(image_paths[i], force=True)
+            return results
+        
+        for i, image, seg_results in zip(pending, images, batch_results):
+            try:
+                masks_data = self.filter_segmentation(seg_results, image.size)
+                results[i] = self.save_crops(image_paths[i], image, masks_data)
+            except Exception as e:
+                print(f"✗ Error segmenting {image_paths[i]}: {e}")
+                import traceback
+                traceback.print_exc()
+                results[i] = []
+        
+        return results
+    
+    def segment_batch(self, image_paths, force=False, batch_size=8):
+        """Segment characters from multiple images, batch_size images per forward pass"""
         print(f"\n{'='*60}")
         print(f"Segmenting {len(image_paths)} images")
         print(f"{'='*60}")
@@ -329,11 +518,12 @@ class CharacterSegmenter:
         results = {}
         total_characters = 0
         
-        for image_path in image_paths:
-            character_images = self.segment_image(image_path, force=force)
-            image_id = Path(image_path).stem
-            results[image_id] = character_images
-            total_characters += len(character_images)
+        for start in range(0, len(image_paths), batch_size):
+            chunk = image_paths[start:start + batch_size]
+            for image_path, character_images in zip(chunk, self.segment_images(chunk, force=force)):
+                image_id = Path(image_path).stem
+                results[image_id] = character_images
+                total_characters += len(character_images)
         
         # Summary
         print(f"\n{'='*60}")
@@ -3,15 +3,26 @@ image_captioner.py - Auto-caption images using WD Tagger
 """
 import os
 import json
+import fnmatch
 from pathlib import Path
 import torch
 import numpy as np
 from PIL import Image
 from transformers import AutoProcessor, AutoModelForImageClassification
 from collections import Counter
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 from huggingface_hub import hf_hub_download
 import pandas as pd
 
+from result_cache import file_sha256
+
+try:
+    from torchvision.io import read_image, ImageReadMode
+    from torchvision.transforms.functional import pil_to_tensor
+except ImportError:
+    read_image = None
+
 import torch
 from pathlib import Path
 from PIL import Image
@@ -20,6 +31,32 @@ from transformers import AutoProcessor, AutoModelForImageClassification
 from huggingface_hub import hf_hub_download
 import numpy as np
 
+
+def scan_caption_pairs(folder, pattern="*.png"):
+    """
+    List a folder once and pair images with their caption files by stem
+    
+    Args:
+        folder: Directory to scan
+        pattern: File pattern images must match
+        
+    Returns:
+        (images, captions): dicts mapping stem -> os.DirEntry of the image / .txt file
+    """
+    images = {}
+    captions = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            if ext == '.txt':
+                captions[stem] = entry
+            elif fnmatch.fnmatchcase(entry.name, pattern):
+                images[stem] = entry
+    return images, captions
+
+
 class ImageCaptioner:
     def __init__(
         self,
@@ -79,60 +116,121 @@ class ImageCaptioner:
         """
         Generate caption for a single image, keeping only Category 0 tags
         """
-        image_path = Path(image_path)
+        return self.caption_images([image_path], save_txt=save_txt)[0] or {}
+    
+    def caption_images(self, image_paths, save_txt=True, preloaded=None):
+        """
+        Generate captions for several images with one batched forward pass
         
-        try:
-            # Load image
-            image = Image.open(image_path).convert("RGB")
+        Args:
+            image_paths: Paths of the images to caption
+            save_txt: Save a .txt caption file next to each image
+            preloaded: Optional result of load_images(image_paths), decoded ahead of time
             
+        Returns:
+            List of tag->score dicts (Category 0 only), in the same order as image_paths;
+            None for images that could not be decoded or whose batch failed
+        """
+        image_paths = [Path(p) for p in image_paths]
+        results = [None for _ in image_paths]
+        
+        # Load images
+        images, loaded = preloaded if preloaded is not None else self.load_images(image_paths)
+        
+        if not images:
+            return results
+        
+        try:
             # Prepare inputs
-            inputs = self.processor(images=image, return_tensors="pt").to(self.device)
+            inputs = self.processor(images=images, return_tensors="pt").to(self.device)
             
             # Get predictions
             with torch.no_grad():
                 outputs = self.model(**inputs)
-                logits = outputs.logits[0]
             
             # Get probabilities
-            probs = torch.sigmoid(logits).cpu().numpy()
-            
-            tags = {}
-            
-            # Iterate through all probabilities
-            for idx, prob in enumerate(probs):
-                if prob >= self.threshold:
-                    # Safety check: ensure index exists in our loaded CSV data
-                    if idx < len(self.tag_names):
-                        
-                        # --- FILTER: ONLY KEEP CATEGORY 0 (GENERAL TAGS) ---
-                        if self.tag_categories[idx] == 0:
-                            
-                            tag_name = self.tag_names[idx]
-                            # Clean up underscores
-                            tag_name_clean = tag_name.replace("_", " ")
-                            tags[tag_name_clean] = float(prob)
-            
-            # Sort by score
-            sorted_tags = dict(sorted(tags.items(), key=lambda x: x[1], reverse=True))
+            batch_probs = torch.sigmoid(outputs.logits).cpu().numpy()
+        except Exception as e:
+            print(f"✗ Error captioning batch of {len(images)} images: {e}")
+            return results
+        
+        for i, probs in zip(loaded, batch_probs):
+            sorted_tags = self.tags_from_probs(probs)
             
             # Save to txt file
             if save_txt and sorted_tags:
-                txt_path = image_path.with_suffix('.txt')
+                txt_path = image_paths[i].with_suffix('.txt')
                 self.save_caption_file(txt_path, sorted_tags)
             
-            return sorted_tags
-            
-        except Exception as e:
-            print(f"✗ Error captioning {image_path.name}: {e}")
-            return {}
+            results[i] = sorted_tags
+        
+        return results
+    
+    def load_images(self, image_paths):
+        """
+        Decode several images, skipping unreadable ones
+        
+        Returns:
+            (images, loaded): decoded images and their indices in image_paths
+        """
+        images = []
+        loaded = []
+        for i, image_path in enumerate(image_paths):
+            try:
+                images.append(self.load_image(image_path))
+                loaded.append(i)
+            except Exception as e:
+                print(f"✗ Error captioning {Path(image_path).name}: {e}")
+        return images, loaded
+    
+    def load_image(self, image_path):
+        """
+        Decode an image as RGB for the processor
+        
+        Uses torchvision's native decoder when available (uint8 CHW tensor,
+        no PIL -> numpy copy), PIL otherwise. With torchvision every image is
+        returned as a CHW tensor, since the processor infers the layout of a
+        whole batch from its first image.
+        """
+        if read_image is None:
+            return Image.open(image_path).convert("RGB")
+        
+        try:
+            return read_image(str(image_path), mode=ImageReadMode.RGB)
+        except RuntimeError:
+            # Format torchvision can't decode, let PIL try
+            return pil_to_tensor(Image.open(image_path).convert("RGB"))
+    
+    def tags_from_probs(self, probs):
+        """Turn per-tag probabilities into a tag->score dict, sorted by score"""
+        tags = {}
+        
+        # Iterate through all probabilities
+        for idx, prob in enumerate(probs):
+            if prob >= self.threshold:
+                # Safety check: ensure index exists in our loaded CSV data
+                if idx < len(self.tag_names):
+                    
+                    # --- FILTER: ONLY KEEP CATEGORY 0 (GENERAL TAGS) ---
+                    if self.tag_categories[idx] == 0:
+                        
+                        tag_name = self.tag_names[idx]
+                        # Clean up underscores
+                        tag_name_clean = tag_name.replace("_", " ")
+                        tags[tag_name_clean] = float(prob)
+        
+        # Sort by score
+        return dict(sorted(tags.items(), key=lambda x: x[1], reverse=True))
     
-    def save_caption_file(self, txt_path, tags):
-        """Save tags to a text file (comma-separated)"""
-        tag_string = ", ".join(tags.keys())
+    @staticmethod
+    def save_caption_file(txt_path, tags):
+        """Save tags (a list, or a dict keyed by tag) to a text file (comma-separated)"""
+        tag_string = ", ".join(tags)
         with open(txt_path, 'w', encoding='utf-8') as f:
             f.write(tag_string)
             
-    def load_caption_file(self, txt_path):
+    @staticmethod
+    def load_caption_file(txt_path):
         """Load tags from a text file"""
         try:
             with open(txt_path, 'r', encoding='utf-8') as f:
@@ -143,19 +241,43 @@ class ImageCaptioner:
         except:
             return []
     
-    def caption_batch(self, image_dir, pattern="*.png"):
+    @property
+    def model_tag(self):
+        """Identifies the model and threshold that produced a caption"""
+        return f"{self.model_name}@{self.threshold}"
+    
+    def caption_batch(self, image_dir, pattern="*.png", batch_size=16, cache=None, progress_callback=None,
+                      cancel_event=None):
         """
         Caption all images in a directory
         
         Args:
             image_dir: Directory containing images
             pattern: File pattern to match
+            batch_size: Images per forward pass
+            cache: Optional ResultCache of captions keyed by image content hash
+            progress_callback: Optional callable([(image_path_str, tags), ...]), called once for
+                the already-captioned images, once for cache hits and once per batch
+            cancel_event: Optional threading.Event, stops before the next batch once set
             
         Returns:
             Dictionary mapping image paths to tags
         """
+        results = {}
+        unreported = []
+        
+        def record(img_path, tags):
+            results[str(img_path)] = tags
+            unreported.append((str(img_path), tags))
+        
+        def report():
+            if progress_callback is not None and unreported:
+                progress_callback(list(unreported))
+            unreported.clear()
+        
         image_dir = Path(image_dir)
-        image_paths = sorted(image_dir.glob(pattern))
+        images, captions = scan_caption_pairs(image_dir, pattern)
+        image_paths = sorted(image_dir / entry.name for entry in images.values())
         
         if not image_paths:
             print(f"No images found in {image_dir}")
@@ -163,23 +285,72 @@ class ImageCaptioner:
         
         print(f"\nCaptioning {len(image_paths)} images from {image_dir.name}...")
         
-        results = {}
+        pending = []
         for idx, img_path in enumerate(image_paths):
-            print(f"  [{idx+1}/{len(image_paths)}] {img_path.name}...", end=" ")
-            
             # Check if already captioned
-            txt_path = img_path.with_suffix('.txt')
-            if txt_path.exists():
-                print("already captioned ⊙")
-                tags = self.load_caption_file(txt_path)
-                results[str(img_path)] = tags
-                continue
-            
-            # Generate caption
-            tags_dict = self.caption_single_image(img_path, save_txt=True)
-            results[str(img_path)] = list(tags_dict.keys())
-            
-            print(f"✓ {len(tags_dict)} tags")
+            caption_entry = captions.get(img_path.stem)
+            if caption_entry is not None:
+                print(f"  [{idx+1}/{len(image_paths)}] {img_path.name}... already captioned ⊙")
+                record(img_path, self.load_caption_file(caption_entry.path))
+            else:
+                pending.append(img_path)
+        report()
+        
+        # Reuse captions of identical image content
+        hashes = {}
+        if cache is not None and pending:
+            misses = []
+            for img_path in pending:
+                hashes[img_path] = file_sha256(img_path)
+                cached = cache.get(hashes[img_path], self.model_tag)
+                if cached is None:
+                    misses.append(img_path)
+                    continue
+                
+                if cached:
+                    self.save_caption_file(img_path.with_suffix('.txt'), cached)
+                record(img_path, list(cached.keys()))
+                print(f"  {img_path.name}... cached caption ⊙")
+            pending = misses
+            report()
+        
+        # Generate captions in batches, decoding the next batch while the
+        # current one runs through the model
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        with ThreadPoolExecutor(max_workers=1) as loader:
+            next_load = loader.submit(self.load_images, chunks[0]) if chunks else None
+            done = 0
+            for i, chunk in enumerate(chunks):
+                if cancel_event is not None and cancel_event.is_set():
+                    print("  Captioning cancelled")
+                    break
+                
+                preloaded = next_load.result()
+                if i + 1 < len(chunks):
+                    next_load = loader.submit(self.load_images, chunks[i + 1])
+                
+                print(f"  Captioning {done + 1}-{done + len(chunk)} of {len(pending)} new images...")
+                done += len(chunk)
+                
+                chunk_results = self.caption_images(chunk, save_txt=True, preloaded=preloaded)
+                for img_path, tags_dict in zip(chunk, chunk_results):
+                    if tags_dict is None:
+                        record(img_path, [])
+                        print(f"    {img_path.name}: ✗ failed")
+                        continue
+                    record(img_path, list(tags_dict.keys()))
+                    print(f"    {img_path.name}: ✓ {len(tags_dict)} tags")
+                report()
+                
+                # Failures are not cached so the next run retries them
+                if cache is not None:
+                    cache.put_many(
+                        self.model_tag,
+                        [
+                            (hashes[p], tags_dict) for p, tags_dict in zip(chunk, chunk_results)
+                            if tags_dict is not None
+                        ]
+                    )
         
         print(f"\n✓ Captioned {len(results)} images")
         return results
@@ -194,11 +365,7 @@ class ImageCaptioner:
         Returns:
             Counter object with tag frequencies
         """
-        all_tags = []
-        for tags in results.values():
-            all_tags.extend(tags)
-        
-        return Counter(all_tags)
+        return Counter(chain.from_iterable(results.values()))
     
     def remove_tag_from_all(self, tag_to_remove, image_dir):
         """
@@ -232,7 +399,8 @@ class ImageCaptioner:
         
         return modified_count
     
-    def get_image_tags(self, image_path):
+    @staticmethod
+    def get_image_tags(image_path):
         """Get tags for a specific image"""
         txt_path = Path(image_path).with_suffix('.txt')
-        return self.load_caption_file(txt_path)
\ No newline at end of file
+        return ImageCaptioner.load_caption_file(txt_path)
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+result_cache.py - SQLite cache of per-image results keyed by content hash
+"""
+import json
+import hashlib
+import sqlite3
+from pathlib import Path
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file's bytes"""
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, db_path):
+        """
+        Open (or create) a result cache
+        
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "hash TEXT NOT NULL, "
+            "model TEXT NOT NULL, "
+            "result TEXT NOT NULL, "
+            "PRIMARY KEY (hash, model))"
+        )
+        self.conn.commit()
+    
+    def get(self, file_hash, model):
+        """
+        Look up a cached result
+        
+        Args:
+            file_hash: Content hash of the image
+            model: Model name/version the result was produced with
+        
+        Returns:
+            The cached (JSON-decoded) result, or None on a miss
+        """
+        row = self.conn.execute(
+            "SELECT result FROM cache WHERE hash = ? AND model = ?",
+            (file_hash, model)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def put(self, file_hash, model, result):
+        """Store a JSON-serializable result"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cache (hash, model, result) VALUES (?, ?, ?)",
+            (file_hash, model, json.dumps(result, ensure_ascii=False))
+        )
+        self.conn.commit()
+    
+    def put_many(self, model, items):
+        """
+        Store several results in one transaction
+        
+        Args:
+            model: Model name/version the results were produced with
+            items: Iterable of (file_hash, result) pairs
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO cache (hash, model, result) VALUES (?, ?, ?)",
+            [(file_hash, model, json.dumps(result, ensure_ascii=False)) for file_hash, result in items]
+        )
+        self.conn.commit()
+    
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
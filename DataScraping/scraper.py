@@ -4,6 +4,9 @@ meme_scraper.py - Download memes from bovagau.vn (Fixed version)
 import os
 import time
 import json
+import random
+import shutil
+import threading
 from pathlib import Path
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -28,9 +31,24 @@ class MemeScraper:
         self.metadata_file = self.download_dir / "metadata.json"
         self.metadata = self.load_metadata()
         
-        # Setup Selenium with Edge
-        self.driver = None
-        self.setup_selenium()
+        # Per-thread WebDriver and download folder, so download_one
+        # can be called concurrently from worker threads
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._drivers = []
+        self._worker_dirs = []
+        
+        # Selenium is set up lazily by the first download that needs a browser
+    
+    @property
+    def driver(self):
+        """WebDriver owned by the calling thread"""
+        return getattr(self._local, 'driver', None)
+    
+    @property
+    def browser_download_dir(self):
+        """Folder the calling thread's browser downloads into"""
+        return getattr(self._local, 'download_dir', self.download_dir)
     
     def load_metadata(self):
         """Load existing metadata or create new"""
@@ -41,11 +59,25 @@ class MemeScraper:
     
     def save_metadata(self):
         """Save metadata to file"""
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+        with self._lock:
+            with open(self.metadata_file, 'w', encoding='utf-8') as f:
+                json.dump(self.metadata, f, indent=2, ensure_ascii=False)
     
-    def setup_selenium(self):
-        """Configure Selenium WebDriver with Edge and download preferences"""
+    def record_result(self, meme_id, entry):
+        """Store a metadata entry for a meme and persist it"""
+        with self._lock:
+            self.metadata[str(meme_id)] = entry
+            self.save_metadata()
+    
+    def setup_selenium(self, download_dir=None):
+        """
+        Configure Selenium WebDriver with Edge and download preferences
+        
+        Args:
+            download_dir: Folder the browser saves files into (defaults to download_dir)
+        """
+        download_dir = Path(download_dir) if download_dir else self.download_dir
+        
         edge_options = Options()
         edge_options.add_argument('--headless')  # Run in background
         edge_options.add_argument('--no-sandbox')
@@ -54,7 +86,7 @@ class MemeScraper:
         
         # Set download directory
         prefs = {
-            "download.default_directory": str(self.download_dir.absolute()),
+            "download.default_directory": str(download_dir.absolute()),
             "download.prompt_for_download": False,
             "download.directory_upgrade": True,
             "safebrowsing.enabled": True
@@ -63,7 +95,12 @@ class MemeScraper:
         edge_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         edge_options.add_experimental_option('useAutomationExtension', False)
         
-        self.driver = webdriver.Edge(options=edge_options)
+        driver = webdriver.Edge(options=edge_options)
+        with self._lock:
+            self._drivers.append(driver)
+        
+        self._local.driver = driver
+        self._local.download_dir = download_dir
         print("✓ Edge WebDriver initialized")
     
     def page_has_download_button(self):
@@ -80,6 +117,31 @@ class MemeScraper:
         except NoSuchElementException:
             return False
     
+    def cached_result(self, meme_id):
+        """
+        Look up a previous download of a meme in the metadata
+        
+        Returns:
+            Existing path, 'skipped' if the meme has no image, or None if it must be fetched
+        """
+        metadata_entry = self.metadata.get(str(meme_id))
+        if not metadata_entry:
+            return None
+        
+        path_value = metadata_entry.get('path')
+        
+        # Only try to use existing path if it's not None and status is success
+        if path_value and metadata_entry.get('status') == 'success':
+            existing_path = Path(path_value)
+            if existing_path.exists():
+                print(f"⊙ Meme {meme_id} already downloaded: {existing_path}")
+                return existing_path
+        elif metadata_entry.get('status') == 'skipped':
+            print(f"⊙ Meme {meme_id} previously skipped (no image)")
+            return 'skipped'
+        
+        return None
+    
     def download_meme(self, meme_id, force=False):
         """
         Download meme image from bovagau.vn
@@ -92,19 +154,14 @@ class MemeScraper:
             Path to downloaded image, None if failed, or 'skipped' if no image
         """
         # Check if already downloaded
-        if not force and str(meme_id) in self.metadata:
-            metadata_entry = self.metadata[str(meme_id)]
-            path_value = metadata_entry.get('path')
-            
-            # Only try to use existing path if it's not None and status is success
-            if path_value and metadata_entry.get('status') == 'success':
-                existing_path = Path(path_value)
-                if existing_path.exists():
-                    print(f"⊙ Meme {meme_id} already downloaded: {existing_path}")
-                    return existing_path
-            elif metadata_entry.get('status') == 'skipped':
-                print(f"⊙ Meme {meme_id} previously skipped (no image)")
-                return 'skipped'
+        if not force:
+            cached = self.cached_result(meme_id)
+            if cached is not None:
+                return cached
+        
+        # Serial callers share the main download folder
+        if self.driver is None:
+            self.setup_selenium()
         
         url = f"https://bovagau.vn/meme/{meme_id}"
         print(f"\nAccessing meme ID: {meme_id}")
@@ -121,14 +178,13 @@ class MemeScraper:
                 print(f"⊘ No image/download button found for meme {meme_id} - Skipping")
                 
                 # Save to metadata as skipped
-                self.metadata[str(meme_id)] = {
+                self.record_result(meme_id, {
                     'path': None,
                     'url': url,
                     'status': 'skipped',
                     'reason': 'no_download_button',
                     'checked_at': datetime.now().isoformat()
-                }
-                self.save_metadata()
+                })
                 
                 return 'skipped'
             
@@ -139,7 +195,8 @@ class MemeScraper:
             )
             
             # Get list of files before download
-            before_files = set(self.download_dir.glob("*"))
+            browser_dir = self.browser_download_dir
+            before_files = set(browser_dir.glob("*"))
             
             # Click download button (with fallback)
             try:
@@ -161,7 +218,7 @@ class MemeScraper:
             new_file = None
             
             while time.time() - start_time < timeout:
-                current_files = set(self.download_dir.glob("*"))
+                current_files = set(browser_dir.glob("*"))
                 new_files = current_files - before_files
                 
                 # Filter out partial downloads and metadata
@@ -188,14 +245,13 @@ class MemeScraper:
                 new_file.rename(new_name)
                 
                 # Save metadata
-                self.metadata[str(meme_id)] = {
+                self.record_result(meme_id, {
                     'path': str(new_name),
                     'url': url,
                     'status': 'success',
                     'downloaded_at': datetime.now().isoformat(),
                     'file_size': os.path.getsize(new_name)
-                }
-                self.save_metadata()
+                })
                 
                 print(f"✓ Downloaded: {new_name}")
                 return new_name
@@ -203,14 +259,13 @@ class MemeScraper:
                 print(f"✗ Download timeout for meme {meme_id}")
                 
                 # Save to metadata as failed
-                self.metadata[str(meme_id)] = {
+                self.record_result(meme_id, {
                     'path': None,
                     'url': url,
                     'status': 'failed',
                     'reason': 'download_timeout',
                     'checked_at': datetime.now().isoformat()
-                }
-                self.save_metadata()
+                })
                 
                 return None
         
@@ -218,14 +273,13 @@ class MemeScraper:
             print(f"⊘ Timeout waiting for page/button for meme {meme_id} - Skipping")
             
             # Save to metadata as skipped
-            self.metadata[str(meme_id)] = {
+            self.record_result(meme_id, {
                 'path': None,
                 'url': url,
                 'status': 'skipped',
                 'reason': 'page_timeout',
                 'checked_at': datetime.now().isoformat()
-            }
-            self.save_metadata()
+            })
             
             return 'skipped'
                 
@@ -233,17 +287,54 @@ class MemeScraper:
             print(f"✗ Error downloading meme {meme_id}: {e}")
             
             # Save to metadata as error
-            self.metadata[str(meme_id)] = {
+            self.record_result(meme_id, {
                 'path': None,
                 'url': url,
                 'status': 'error',
                 'reason': str(e),
                 'checked_at': datetime.now().isoformat()
-            }
-            self.save_metadata()
+            })
             
             return None
     
+    def download_one(self, meme_id, delay=0, force=False):
+        """
+        Download a single meme, safe to call concurrently from worker threads
+        
+        Each calling thread lazily gets its own WebDriver and a private
+        download folder, so new-file detection never sees another worker's file.
+        Memes already in the metadata return immediately, without starting a
+        browser or waiting.
+        
+        Args:
+            meme_id: The ID number of the meme
+            delay: Mean delay after a page fetch (seconds), keeps each worker polite
+            force: Force download even if already exists
+            
+        Returns:
+            Same as download_meme
+        """
+        if not force:
+            cached = self.cached_result(meme_id)
+            if cached is not None:
+                return cached
+        
+        if self.driver is None:
+            worker_dir = self.download_dir / f".worker_{threading.get_ident()}"
+            worker_dir.mkdir(exist_ok=True)
+            with self._lock:
+                self._worker_dirs.append(worker_dir)
+            self.setup_selenium(worker_dir)
+        
+        # Cache was checked above, go straight to the network
+        result = self.download_meme(meme_id, force=True)
+        
+        # Jitter so workers don't hit the server in lockstep
+        if delay:
+            time.sleep(random.uniform(0.5, 1.5) * delay)
+        
+        return result
+    
     def download_batch(self, start_id=0, count=10, delay=2, force=False):
         """
         Download multiple memes in batch
@@ -351,7 +442,16 @@ class MemeScraper:
         ]
     
     def cleanup(self):
-        """Close Selenium driver"""
-        if self.driver:
-            self.driver.quit()
+        """Close all Selenium drivers and worker download folders"""
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+            worker_dirs, self._worker_dirs = self._worker_dirs, []
+        
+        for driver in drivers:
+            driver.quit()
+        
+        for worker_dir in worker_dirs:
+            shutil.rmtree(worker_dir, ignore_errors=True)
+        
+        if drivers:
             print("\n✓ Cleaned up resources")
\ No newline at end of file
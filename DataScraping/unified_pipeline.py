@@ -4,20 +4,117 @@ Pipeline: download → segment to discard → sort → caption → manage tags
 """
 import os
 import json
+import queue
 import shutil
+import functools
+from contextlib import contextmanager
 from pathlib import Path
 from PIL import Image, ImageTk
 import tkinter as tk
 from tkinter import ttk, messagebox, font as tkfont, scrolledtext
-from threading import Thread
-from collections import Counter
+from threading import Thread, Lock, Event, current_thread, main_thread
+from collections import Counter, OrderedDict
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 
 from scraper import MemeScraper
 from character_segment import CharacterSegmenter
-from image_captioner import ImageCaptioner
+from image_captioner import ImageCaptioner, scan_caption_pairs
+from result_cache import ResultCache, file_sha256
+
+
+@functools.lru_cache(maxsize=4096)
+def _load_tags_cached(path_str, mtime_ns, size):
+    """Parse a caption file; mtime/size in the key make edited files miss the cache"""
+    return tuple(ImageCaptioner.load_caption_file(path_str))
+
+
+def _fit_to_frame(img, size):
+    """Center img on a size-sized background frame, so pasting it fully overwrites a PhotoImage slot"""
+    frame = Image.new('RGB', size, '#1a1a1a')
+    offset = ((size[0] - img.width) // 2, (size[1] - img.height) // 2)
+    frame.paste(img, offset, img if img.mode == 'RGBA' else None)
+    return frame
+
+
+@functools.lru_cache(maxsize=64)
+def _viewer_frame_of(path_str, mtime_ns, size):
+    """Decode and downscale an image into a viewer frame of the given size; mtime in the key invalidates edits"""
+    img = Image.open(path_str)
+    img.draft('RGB', size)  # JPEG decodes at reduced scale, no-op for PNG
+    img.thumbnail(size, Image.Resampling.BILINEAR)
+    return _fit_to_frame(img, size)
+
+
+@contextmanager
+def _exclusive_lock(lock_path):
+    """Hold an OS-level exclusive lock on lock_path (flock on POSIX, msvcrt on Windows)"""
+    with open(lock_path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
 
 
 class UnifiedPipeline:
+    # session_stats key -> counter attribute
+    STAT_ATTRS = {
+        'memes_processed': 'n_memes_processed',
+        'memes_downloaded': 'n_memes_downloaded',
+        'memes_skipped': 'n_memes_skipped',
+        'Bo': 'n_bo',
+        'Gau': 'n_gau',
+        'Others': 'n_others',
+        'Discarded': 'n_discarded',
+        'total_sorted': 'n_total_sorted',
+        'total_characters': 'n_total_characters'
+    }
+    
+    # Metadata files above this size are stream-parsed (needs ijson)
+    STREAM_METADATA_BYTES = 10_000_000
+    
+    # Pending metadata changes are written at most this often (ms)
+    METADATA_FLUSH_MS = 500
+    
+    # Character previews decoded ahead of the one on screen
+    PREFETCH_AHEAD = 3
+    THUMB_CACHE_SIZE = 8
+    FILTER_DEBOUNCE_MS = 120
+    
+    # Tag list is redrawn after this many streamed caption results
+    CAPTION_REDRAW_EVERY = 200
+    
     def __init__(self):
         """Initialize the unified pipeline"""
         self.root = None
@@ -29,11 +126,28 @@ class UnifiedPipeline:
         self.download_dir_var = None
         self.sorted_dir_var = None
         self.hf_token_var = None
+        self.precision_var = None
         
         # Pipeline components
         self.scraper = None
         self.segmenter = None
         self.captioner = None
+        self._captioner_lock = Lock()
+        self.seg_cache = None
+        self._seg_loader = None
+        self._seg_load_error = None
+        self._segmenter_config = None
+        
+        # Each download worker drives its own headless browser
+        self.download_workers = 4
+        self._cancel_downloads = False
+        self._download_error = None
+        
+        # Set when the window is closed, background work checks it to wind down
+        self._closing = Event()
+        
+        # Memes per SAM3 forward pass
+        self.segment_batch_size = 8
         
         # Output directories
         self.download_dir = None
@@ -42,10 +156,19 @@ class UnifiedPipeline:
         self.gau_folder = None
         self.others_folder = None
         self.discarded_folder = None
+        self.folder_map = {}
+        self._dest_name_cache = {}
+        self._same_fs = False
         
         # Metadata
         self.metadata_file = None
         self.metadata = {}
+        self._metadata_dirty = False
+        
+        # Metadata snapshots are serialized and written by a background thread
+        self._metadata_queue = queue.Queue()
+        self._metadata_writer = Thread(target=self._metadata_writer_loop, daemon=True)
+        self._metadata_writer.start()
         
         # Current state
         self.is_running = False
@@ -55,20 +178,33 @@ class UnifiedPipeline:
         self.current_image_path = None
         
         # Captioning state
+        # caption_results/tag_stats are only read and replaced on the Tk thread;
+        # workers hand results over through root.after
         self.caption_results = {}
         self.tag_stats = Counter()
+        self._captions_since_redraw = 0
+        self._sorted_tags = None  # (tag, lowercase tag, display row) by count, rebuilt when tag_stats changes
+        self._listbox_tags = []  # Tag shown on each tag_listbox row
+        self._filter_after_id = None
+        self._last_filter = None  # (source _sorted_tags list, filter text, matching entries)
         self.selected_image_for_tags = None
         
-        # Statistics
-        self.stats = {
-            'memes_processed': 0,
-            'memes_downloaded': 0,
-            'memes_skipped': 0,
-            'Bo': 0,
-            'Gau': 0,
-            'Others': 0,
-            'Discarded': 0,
-            'total_characters': 0
+        # Statistics (plain counters, see stats_snapshot for the dict form)
+        self.n_memes_processed = 0
+        self.n_memes_downloaded = 0
+        self.n_memes_skipped = 0
+        self.n_bo = 0
+        self.n_gau = 0
+        self.n_others = 0
+        self.n_discarded = 0
+        self.n_total_sorted = 0  # Running sum of the four category counters
+        self.n_total_characters = 0
+        
+        self._bumpers = {
+            'Bo': self._bump_bo,
+            'Gau': self._bump_gau,
+            'Others': self._bump_others,
+            'Discarded': self._bump_discarded
         }
         
         # History for undo
@@ -85,6 +221,26 @@ class UnifiedPipeline:
         self.stats_label = None
         self.progress_label = None
         self.start_button = None
+        self.remove_tag_button = None
+        
+        # Character preview
+        self.preview_size = (700, 400)
+        self._photo_ring = []
+        self._ring_idx = 0
+        self._thumb_cache = OrderedDict()
+        self._thumb_lock = Lock()
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=2)
+        
+        # Captioning runs are queued on one long-lived worker thread
+        self._caption_worker = ThreadPoolExecutor(max_workers=1)
+        
+        # Bulk file operations (caption rewrites) run here off the Tk thread
+        self._io_pool = ThreadPoolExecutor(max_workers=4)
+        
+        # Caption viewer preview
+        self.viewer_size = (300, 300)
+        self._viewer_slots = []
+        self._viewer_slot_idx = 0
     
     def create_ui(self):
         """Create the unified UI with tabs"""
@@ -92,6 +248,7 @@ class UnifiedPipeline:
         self.root.title("Meme Character Pipeline")
         self.root.geometry("1200x950")
         self.root.configure(bg='#2b2b2b')
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Title
         title_font = tkfont.Font(family="Arial", size=24, weight="bold")
@@ -131,6 +288,9 @@ class UnifiedPipeline:
         self.root.bind('<Down>', lambda e: self.sort_character('Discarded') if self.is_running else None)
         self.root.bind('<BackSpace>', lambda e: self.undo_action() if self.is_running else None)
         self.root.bind('<Escape>', lambda e: self.stop_pipeline())
+        
+        # Coalesced metadata writes
+        self.root.after(self.METADATA_FLUSH_MS, self._flush_metadata)
     
     def create_pipeline_tab(self, parent):
         """Create the pipeline tab (original functionality)"""
@@ -214,8 +374,11 @@ class UnifiedPipeline:
         scrollbar = tk.Scrollbar(list_frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Rows are set in one go through the list variable
+        self._tag_listvar = tk.StringVar()
         self.tag_listbox = tk.Listbox(
             list_frame,
+            listvariable=self._tag_listvar,
             font=("Courier", 10),
             bg='#1a1a1a',
             fg='#ffffff',
@@ -229,7 +392,7 @@ class UnifiedPipeline:
         self.tag_listbox.bind('<<ListboxSelect>>', self.on_tag_select)
         
         # Remove tag button
-        remove_btn = tk.Button(
+        self.remove_tag_button = tk.Button(
             left_frame,
             text="❌ Remove Selected Tag from All Images",
             command=self.remove_selected_tag,
@@ -242,7 +405,7 @@ class UnifiedPipeline:
             pady=5,
             cursor="hand2"
         )
-        remove_btn.pack(pady=10)
+        self.remove_tag_button.pack(pady=10)
         
         # Right: Image browser
         right_frame = tk.LabelFrame(
@@ -292,6 +455,13 @@ class UnifiedPipeline:
         self.preview_label = tk.Label(preview_frame, bg='#1a1a1a', fg='#888888', text="Select an image")
         self.preview_label.pack(expand=True)
         
+        # Two PhotoImage slots used alternately, repainted with paste()
+        self._viewer_slots = [
+            ImageTk.PhotoImage(Image.new('RGB', self.viewer_size, '#1a1a1a'))
+            for _ in range(2)
+        ]
+        self._viewer_slot_idx = 0
+        
         # Tags display
         tags_display_frame = tk.Frame(right_frame, bg='#2b2b2b')
         tags_display_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -380,6 +550,23 @@ class UnifiedPipeline:
             font=input_font
         ).grid(row=1, column=1, padx=10, pady=5, sticky=tk.W)
         
+        tk.Label(
+            self.config_frame,
+            text="SAM3 Precision:",
+            font=input_font,
+            bg='#2b2b2b',
+            fg='#cccccc'
+        ).grid(row=1, column=2, padx=10, pady=5, sticky=tk.W)
+        
+        self.precision_var = tk.StringVar(value="fp32")
+        ttk.Combobox(
+            self.config_frame,
+            textvariable=self.precision_var,
+            values=["fp32", "bf16", "fp16"],
+            state='readonly',
+            width=12
+        ).grid(row=1, column=3, padx=10, pady=5, sticky=tk.W)
+        
         # Row 3: Directories
         tk.Label(
             self.config_frame,
@@ -509,6 +696,14 @@ class UnifiedPipeline:
         self.image_label = tk.Label(image_frame, bg='#1a1a1a')
         self.image_label.pack(expand=True)
         
+        # Reusable PhotoImage slots, frames are pasted in-place instead of
+        # allocating a new Tk image per character
+        self._photo_ring = [
+            ImageTk.PhotoImage(Image.new('RGB', self.preview_size, '#1a1a1a'))
+            for _ in range(4)
+        ]
+        self._ring_idx = 0
+        
         # Controls
         controls_frame = tk.Frame(self.sorting_frame, bg='#2b2b2b')
         controls_frame.pack(pady=10)
@@ -542,23 +737,52 @@ class UnifiedPipeline:
         self.update_stats_display()
     
     def update_progress(self, message):
-        """Update progress label"""
+        """Update progress label (safe to call from worker threads)"""
+        if current_thread() is not main_thread():
+            # Hand the update to the Tk thread instead of touching widgets here
+            self.root.after(0, self.update_progress, message)
+            return
+        
         self.progress_label.config(text=message)
-        self.root.update()
+        self.root.update_idletasks()
     
     def update_stats_display(self):
         """Update statistics display"""
         remaining = len(self.images_to_sort) - self.current_index
         stats_text = (
-            f"Memes: {self.stats['memes_processed']} processed | "
+            f"Memes: {self.n_memes_processed} processed | "
             f"Remaining: {remaining} | "
-            f"Bo: {self.stats['Bo']} | Gau: {self.stats['Gau']} | "
-            f"Others: {self.stats['Others']} | Discarded: {self.stats['Discarded']}"
+            f"Bo: {self.n_bo} | Gau: {self.n_gau} | "
+            f"Others: {self.n_others} | Discarded: {self.n_discarded}"
         )
         self.stats_label.config(text=stats_text)
     
+    def stats_snapshot(self):
+        """Return the counters as a session_stats dict"""
+        return {key: getattr(self, attr) for key, attr in self.STAT_ATTRS.items()}
+    
+    def _bump(self, category, delta=1):
+        """Adjust the counter of a sorting category"""
+        self._bumpers[category](delta)
+        self.n_total_sorted += delta
+    
+    def _bump_bo(self, delta):
+        self.n_bo += delta
+    
+    def _bump_gau(self, delta):
+        self.n_gau += delta
+    
+    def _bump_others(self, delta):
+        self.n_others += delta
+    
+    def _bump_discarded(self, delta):
+        self.n_discarded += delta
+    
     def setup_directories(self):
         """Setup output directories"""
+        # Don't lose pending changes when the metadata is reloaded below
+        self.save_metadata_final()
+        
         self.download_dir = Path(self.download_dir_var.get())
         self.sorted_dir = Path(self.sorted_dir_var.get())
         
@@ -567,9 +791,20 @@ class UnifiedPipeline:
         self.others_folder = self.sorted_dir / "Others"
         self.discarded_folder = self.sorted_dir / "Discarded"
         
-        for folder in [self.bo_folder, self.gau_folder, self.others_folder, self.discarded_folder]:
+        self._dest_name_cache = {}
+        self.folder_map = {
+            'Bo': self.bo_folder,
+            'Gau': self.gau_folder,
+            'Others': self.others_folder,
+            'Discarded': self.discarded_folder
+        }
+        
+        for folder in self.folder_map.values():
             folder.mkdir(parents=True, exist_ok=True)
         
+        # Sorting moves can be plain renames when everything is on one device
+        self._same_fs = len({folder.stat().st_dev for folder in self.folder_map.values()}) == 1
+        
         # Load metadata
         self.metadata_file = self.sorted_dir / "sorting_metadata.json"
         self.load_metadata()
@@ -577,19 +812,103 @@ class UnifiedPipeline:
     def load_metadata(self):
         """Load existing metadata"""
         if self.metadata_file and self.metadata_file.exists():
-            with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.metadata = data
-                # Load stats
-                for key in self.stats:
-                    if key in data.get('session_stats', {}):
-                        self.stats[key] = data['session_stats'][key]
+            if ijson is not None and self.metadata_file.stat().st_size > self.STREAM_METADATA_BYTES:
+                data = self._stream_metadata()
+            elif orjson is not None:
+                data = orjson.loads(self.metadata_file.read_bytes())
+            else:
+                with open(self.metadata_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            self.metadata = data
+            
+            # Load stats
+            session_stats = data.get('session_stats', {})
+            for key, attr in self.STAT_ATTRS.items():
+                if key in session_stats:
+                    setattr(self, attr, session_stats[key])
+            
+            # Metadata written before total_sorted was tracked
+            if 'total_sorted' not in session_stats:
+                self.n_total_sorted = self.n_bo + self.n_gau + self.n_others + self.n_discarded
+    
+    def _stream_metadata(self):
+        """Parse a large metadata file incrementally, in one pass over its top-level keys"""
+        with open(self.metadata_file, 'rb') as f:
+            return dict(ijson.kvitems(f, '', use_float=True))
     
     def save_metadata(self):
-        """Save metadata to file"""
-        self.metadata['session_stats'] = self.stats
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+        """Mark metadata as changed, it is written by the next _flush_metadata"""
+        self._metadata_dirty = True
+    
+    def save_metadata_final(self):
+        """Write pending metadata now, pretty-printed, and wait for it (shutdown/completion)"""
+        if self._metadata_dirty and self.metadata_file:
+            self._queue_metadata_write(indent=2)
+        self._metadata_queue.join()
+    
+    def _flush_metadata(self):
+        """Periodic hand-off of pending metadata changes to the writer thread"""
+        try:
+            if self._metadata_dirty and self.metadata_file:
+                self._queue_metadata_write()
+        finally:
+            self.root.after(self.METADATA_FLUSH_MS, self._flush_metadata)
+    
+    def _queue_metadata_write(self, indent=None):
+        """Snapshot metadata on the calling thread and queue it for writing"""
+        self.metadata['session_stats'] = self.stats_snapshot()
+        
+        # Entries are replaced, never mutated, so copying the containers is enough
+        snapshot = dict(self.metadata)
+        snapshot['sorted_images'] = dict(self.metadata.get('sorted_images', {}))
+        
+        self._metadata_dirty = False
+        self._metadata_queue.put((self.metadata_file, snapshot, indent))
+    
+    def _metadata_writer_loop(self):
+        """Write queued metadata snapshots, keeping only the newest of a burst"""
+        while True:
+            jobs = [self._metadata_queue.get()]
+            while True:
+                try:
+                    jobs.append(self._metadata_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # Newest snapshot per file wins; pretty output if any job asked for it
+            latest = {}
+            for metadata_file, snapshot, indent in jobs:
+                prev_indent = latest[metadata_file][1] if metadata_file in latest else None
+                latest[metadata_file] = (snapshot, indent or prev_indent)
+            
+            for metadata_file, (snapshot, indent) in latest.items():
+                try:
+                    self._write_metadata(metadata_file, snapshot, indent)
+                except OSError as e:
+                    print(f"Error saving metadata: {e}")
+            
+            for _ in jobs:
+                self._metadata_queue.task_done()
+    
+    def _write_metadata(self, metadata_file, metadata, indent=None):
+        """Atomically replace the metadata file"""
+        tmp_file = metadata_file.with_suffix('.tmp')
+        
+        # Lock so readers honouring the lock file never see a half-replaced file
+        with _exclusive_lock(metadata_file.with_suffix('.lock')):
+            with open(tmp_file, 'wb') as f:
+                if orjson is not None:
+                    # orjson only supports 2-space indentation
+                    option = orjson.OPT_INDENT_2 if indent else 0
+                    f.write(orjson.dumps(metadata, option=option))
+                else:
+                    separators = None if indent else (',', ':')
+                    f.write(json.dumps(
+                        metadata, indent=indent, separators=separators, ensure_ascii=False
+                    ).encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, metadata_file)
     
     def start_pipeline(self):
         """Start the pipeline in a background thread"""
@@ -614,62 +933,99 @@ class UnifiedPipeline:
         self.is_running = True
         self.start_button.config(state=tk.DISABLED, text="RUNNING...", bg='#757575')
         
+        # Load SAM3 in its own thread so it overlaps the downloads
+        hf_token = self.hf_token_var.get().strip() or None
+        self._seg_loader = Thread(
+            target=self.load_segmenter,
+            args=(hf_token, self.precision_var.get()),
+            daemon=True
+        )
+        self._seg_loader.start()
+        
         # Run pipeline in background thread
         thread = Thread(target=self.run_pipeline, daemon=True)
         thread.start()
     
+    def load_segmenter(self, hf_token, precision):
+        """Load (and compile) SAM3, reusing the loaded model when settings are unchanged"""
+        self._seg_load_error = None
+        config = (str(self.discarded_folder), hf_token, precision)
+        
+        if (self.segmenter is not None and self.segmenter.model is not None
+                and self._segmenter_config == config):
+            return
+        
+        try:
+            self.update_progress("Loading SAM3 model...")
+            self.segmenter = CharacterSegmenter(
+                output_dir=str(self.discarded_folder), 
+                hf_token=hf_token,
+                dtype=precision
+            )
+            self._segmenter_config = config
+            
+            self.update_progress("Compiling SAM3 model...")
+            self.segmenter.compile_model(batch_size=self.segment_batch_size)
+        except Exception as e:
+            self._seg_load_error = e
+    
     def run_pipeline(self):
         """Run the download and segmentation pipeline"""
+        downloader = None
+        meme_queue = queue.Queue(maxsize=32)
+        
         try:
             start_id = int(self.start_id_var.get())
             count = int(self.count_var.get())
             delay = float(self.delay_var.get())
             
-            # Phase 1: Download
+            # Phase 1: Download in the background, memes are queued as they finish
             self.update_progress("Downloading memes in batch...")
             self.scraper = MemeScraper(download_dir=str(self.download_dir))
             
-            downloaded_results = self.scraper.download_batch(
-                start_id=start_id,
-                count=count,
-                delay=delay,
-                force=False
+            self._cancel_downloads = False
+            self._download_error = None
+            downloader = Thread(
+                target=self._download_worker,
+                args=(meme_queue, range(start_id, start_id + count), delay),
+                daemon=True
             )
+            downloader.start()
             
-            # Update stats
-            downloaded_memes = [int(mid) for mid in downloaded_results.keys()]
-            self.stats['memes_downloaded'] = len(downloaded_memes)
-            self.stats['memes_skipped'] = len(self.scraper.get_skipped_memes())
-            
-            # Cleanup scraper
-            if self.scraper:
-                self.scraper.cleanup()
-            
-            if not downloaded_memes:
-                self.update_progress("No memes downloaded. Nothing to segment.")
-                self.show_completion()
-                return
+            # Phase 2: Segment (model has been loading since start_pipeline)
+            if self._seg_loader.is_alive():
+                self.update_progress("Waiting for SAM3 model...")
+            self._seg_loader.join()
+            if self._seg_load_error:
+                raise self._seg_load_error
             
-            # Phase 2: Segment
-            self.update_progress("Loading SAM3 model...")
-            hf_token = self.hf_token_var.get().strip() or None
-            self.segmenter = CharacterSegmenter(
-                output_dir=str(self.discarded_folder), 
-                hf_token=hf_token
-            )
+            # Segmentation results of previous runs, keyed by image content
+            self.seg_cache = ResultCache(self.sorted_dir / "seg_cache.db")
             
+            downloaded_memes = []
             total_characters = 0
-            for meme_id in downloaded_memes:
-                if not self.is_running:
-                    break
+            finished = False
+            while not finished:
+                batch, finished = self._next_meme_batch(meme_queue, self.segment_batch_size)
+                downloaded_memes.extend(meme_id for meme_id, _ in batch)
                 
-                self.current_meme_id = meme_id
-                meme_path = downloaded_results[meme_id]
+                # Keep draining so the downloader can finish
+                if not batch or not self.is_running:
+                    continue
                 
-                self.update_progress(f"Segmenting meme {meme_id}...")
+                meme_ids = ", ".join(str(meme_id) for meme_id, _ in batch)
+                self.update_progress(f"Segmenting meme {meme_ids}...")
                 
                 try:
-                    character_paths = self.segmenter.segment_image(meme_path, force=False)
+                    batch_paths = self.segment_memes([meme_path for _, meme_path in batch])
+                except Exception as e:
+                    self.update_progress(f"Error segmenting meme {meme_ids}: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    continue
+                
+                for (meme_id, _), character_paths in zip(batch, batch_paths):
+                    self.current_meme_id = meme_id
                     
                     if character_paths:
                         total_characters += len(character_paths)
@@ -679,18 +1035,26 @@ class UnifiedPipeline:
                     else:
                         self.update_progress(f"No characters found in meme {meme_id}")
                     
-                    self.stats['memes_processed'] += 1
-                    
-                except Exception as e:
-                    self.update_progress(f"Error segmenting meme {meme_id}: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    self.n_memes_processed += 1
+            
+            downloader.join()
+            if self._download_error:
+                raise self._download_error
+            
+            # Update stats
+            self.n_memes_downloaded = len(downloaded_memes)
+            self.n_memes_skipped = len(self.scraper.get_skipped_memes())
+            
+            if not downloaded_memes:
+                self.update_progress("No memes downloaded. Nothing to segment.")
+                self.show_completion()
+                return
             
             # Phase 3: Load for sorting
             self.update_progress("Loading characters for sorting...")
             self.load_images_from_discard()
             
-            self.stats['total_characters'] = total_characters
+            self.n_total_characters = total_characters
             
             # Start sorting
             if self.images_to_sort:
@@ -705,29 +1069,156 @@ class UnifiedPipeline:
             import traceback
             traceback.print_exc()
             self.stop_pipeline()
+        finally:
+            if self.seg_cache:
+                self.seg_cache.close()
+                self.seg_cache = None
+            
+            if downloader is not None and downloader.is_alive():
+                # Bailed out early: stop new downloads and unblock the producer
+                self._cancel_downloads = True
+                while downloader.is_alive():
+                    try:
+                        meme_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        pass
+    
+    def segment_memes(self, meme_paths):
+        """Segment memes in one batch, reusing cached results for identical image content"""
+        model = self.segmenter.model_tag
+        file_hashes = [file_sha256(meme_path) for meme_path in meme_paths]
+        results = [self.seg_cache.get(file_hash, model) for file_hash in file_hashes]
+        
+        # A hit is only usable while its crops are still on disk or were moved by sorting
+        if any(character_paths for character_paths in results):
+            moved = {
+                entry.get('original_path')
+                for destination, entry in self.metadata.get('sorted_images', {}).items()
+                if entry.get('original_path') != destination
+            }
+            for i, character_paths in enumerate(results):
+                if character_paths and not all(
+                    path in moved or os.path.exists(path) for path in character_paths
+                ):
+                    results[i] = None
+        
+        misses = [i for i, character_paths in enumerate(results) if character_paths is None]
+        if misses:
+            fresh = self.segmenter.segment_images([meme_paths[i] for i in misses], force=False)
+            for i, character_paths in zip(misses, fresh):
+                results[i] = character_paths
+                
+                # Only successful segmentations are recorded, don't cache failures
+                if Path(meme_paths[i]).stem in self.segmenter.metadata:
+                    self.seg_cache.put(file_hashes[i], model, character_paths)
+        
+        return results
+    
+    def _next_meme_batch(self, meme_queue, max_items):
+        """
+        Wait for one downloaded meme, then take whatever else is already queued
+        
+        Returns:
+            (batch of (meme_id, path) tuples, True once the download sentinel was seen)
+        """
+        batch = []
+        item = meme_queue.get()
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= max_items:
+                return batch, False
+            try:
+                item = meme_queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
+    
+    def _download_worker(self, meme_queue, meme_ids, delay):
+        """Download memes concurrently, queueing (meme_id, path) as each one finishes"""
+        count = len(meme_ids)
+        downloaded = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+                futures = {
+                    executor.submit(self.download_meme, meme_id, delay): meme_id
+                    for meme_id in meme_ids
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    result = future.result()
+                    if isinstance(result, Path):
+                        downloaded += 1
+                        meme_queue.put((futures[future], str(result)))
+                    self.update_progress(
+                        f"Downloaded {done}/{count} memes ({downloaded} with images)"
+                    )
+        except Exception as e:
+            self._download_error = e
+        finally:
+            self.scraper.cleanup()
+            meme_queue.put(None)
+    
+    def download_meme(self, meme_id, delay):
+        """Download a single meme on a worker thread (skipped once stopped)"""
+        if not self.is_running or self._cancel_downloads:
+            return None
+        return self.scraper.download_one(meme_id, delay=delay, force=False)
     
     def load_images_from_discard(self):
         """Load all images from discard folder for sorting"""
         self.images_to_sort = []
+        with self._thumb_lock:
+            self._thumb_cache.clear()
+        
+        # Names of characters already moved out of the discard folder
+        already_sorted_names = {
+            sorted_path.name
+            for sorted_path in map(Path, self.metadata.get('sorted_images', {}))
+            if sorted_path.parent != self.discarded_folder
+        }
         
-        for img_path in sorted(self.discarded_folder.glob("*.png")):
-            if 'sorted_images' in self.metadata:
-                already_sorted = False
-                for sorted_path, info in self.metadata['sorted_images'].items():
-                    sorted_path_obj = Path(sorted_path)
-                    if sorted_path_obj.name == img_path.name:
-                        if sorted_path_obj.parent != self.discarded_folder:
-                            already_sorted = True
-                            break
-                
-                if already_sorted:
-                    continue
-            
-            self.images_to_sort.append(img_path)
+        with os.scandir(self.discarded_folder) as it:
+            entries = [
+                e for e in it
+                if e.name.endswith('.png') and e.name not in already_sorted_names and e.is_file()
+            ]
+        entries.sort(key=lambda e: e.name)
+        self.images_to_sort = [Path(e.path) for e in entries]
         
         self.current_index = 0
         print(f"Loaded {len(self.images_to_sort)} images for sorting")
     
+    def load_preview_image(self, image_path):
+        """Decode and downscale an image to fit the preview area
+        
+        Uses OpenCV when available (faster decode/resize, releases the GIL),
+        PIL is then only used as the bridge to Tk.
+        """
+        max_w, max_h = self.preview_size
+        
+        if cv2 is None:
+            img = Image.open(image_path)
+            
+            # Cheap integer box-downscale first so LANCZOS runs on a small image
+            factor = max(1, min(img.width // max_w, img.height // max_h))
+            if factor > 1:
+                img = img.reduce(factor)
+            
+            img.thumbnail(self.preview_size, Image.Resampling.LANCZOS)
+            return img
+        
+        # imdecode + fromfile instead of imread to support non-ASCII paths
+        arr = cv2.imdecode(np.fromfile(str(image_path), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if arr is None:
+            raise ValueError(f"Could not decode image: {image_path}")
+        
+        h, w = arr.shape[:2]
+        scale = min(max_w / w, max_h / h, 1.0)
+        if scale < 1.0:
+            new_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+            arr = cv2.resize(arr, new_size, interpolation=cv2.INTER_AREA)
+        arr = cv2.cvtColor(arr, cv2.COLOR_BGR2RGB)
+        return Image.fromarray(arr)
+    
     def show_next_character(self):
         """Show next character"""
         if not self.is_running:
@@ -747,89 +1238,136 @@ class UnifiedPipeline:
         
         # Display image
         try:
-            img = Image.open(self.current_image_path)
+            key = self._preview_key(self.current_image_path)
+            with self._thumb_lock:
+                img = self._thumb_cache.pop(key, None)
+            if img is None:
+                img = self.load_preview_image(self.current_image_path)
             
-            max_size = (700, 400)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            frame = _fit_to_frame(img, self.preview_size)
             
-            photo = ImageTk.PhotoImage(img)
-            self.image_label.config(image=photo)
-            self.image_label.image = photo
+            slot = self._photo_ring[self._ring_idx]
+            slot.paste(frame)
+            self.image_label.config(image=slot)
+            self._ring_idx = (self._ring_idx + 1) % len(self._photo_ring)
         except Exception as e:
             print(f"Error loading image {self.current_image_path}: {e}")
             self.current_index += 1
             self.root.after(100, self.show_next_character)
             return
         
+        self.prefetch_upcoming()
         self.update_stats_display()
     
+    def prefetch_upcoming(self):
+        """Decode the next few previews in the background"""
+        start = self.current_index + 1
+        for image_path in self.images_to_sort[start:start + self.PREFETCH_AHEAD]:
+            self._prefetch_pool.submit(self._prefetch_preview, image_path)
+    
+    @staticmethod
+    def _preview_key(image_path):
+        """Cache key of a preview: (path, mtime_ns), so re-segmented crops with a reused name miss"""
+        try:
+            return image_path, os.stat(image_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _prefetch_preview(self, image_path):
+        """Worker: decode one preview into the LRU cache (PIL image, PhotoImage is made on the Tk thread)"""
+        key = self._preview_key(image_path)
+        if key is None:
+            return
+        with self._thumb_lock:
+            if key in self._thumb_cache:
+                return
+        
+        try:
+            img = self.load_preview_image(image_path)
+        except Exception:
+            # show_next_character reports the error when it gets there
+            return
+        
+        with self._thumb_lock:
+            self._thumb_cache[key] = img
+            self._thumb_cache.move_to_end(key)
+            while len(self._thumb_cache) > self.THUMB_CACHE_SIZE:
+                self._thumb_cache.popitem(last=False)
+    
     def sort_character(self, category):
         """Sort current character into category"""
         if not self.current_image_path or not self.current_image_path.exists():
             return
         
-        folder_map = {
-            'Bo': self.bo_folder,
-            'Gau': self.gau_folder,
-            'Others': self.others_folder,
-            'Discarded': self.discarded_folder
-        }
-        destination = folder_map[category]
+        destination = self.folder_map[category]
         
         if category == 'Discarded':
-            if 'sorted_images' not in self.metadata:
-                self.metadata['sorted_images'] = {}
-            
-            self.metadata['sorted_images'][str(self.current_image_path)] = {
-                'category': 'Discarded',
-                'original_path': str(self.current_image_path)
-            }
-            self.save_metadata()
-            
-            self.stats['Discarded'] += 1
-            
-            self.history.append({
-                'source': self.current_image_path,
-                'destination': self.current_image_path,
-                'category': category,
-                'action': 'keep'
-            })
+            self._record_sort(category, self.current_image_path, self.current_image_path, 'keep')
         else:
-            dest_path = destination / self.current_image_path.name
-            
-            if dest_path.exists():
-                counter = 1
-                stem = dest_path.stem
-                suffix = dest_path.suffix
-                while dest_path.exists():
-                    dest_path = destination / f"{stem}_{counter}{suffix}"
-                    counter += 1
-            
-            shutil.move(str(self.current_image_path), str(dest_path))
-            
-            if 'sorted_images' not in self.metadata:
-                self.metadata['sorted_images'] = {}
-            
-            self.metadata['sorted_images'][str(dest_path)] = {
-                'category': category,
-                'original_path': str(self.current_image_path)
-            }
-            self.save_metadata()
+            dest_path = self._unique_destination(destination, self.current_image_path.name)
             
-            self.stats[category] += 1
+            self._move_file(self.current_image_path, dest_path)
+            self._dest_names(destination).add(dest_path.name)
             
-            self.history.append({
-                'source': self.current_image_path,
-                'destination': dest_path,
-                'category': category,
-                'action': 'move'
-            })
+            self._record_sort(category, self.current_image_path, dest_path, 'move')
         
         self.current_index += 1
         self.update_stats_display()
         
         self.root.after(100, self.show_next_character)
     
+    def _move_file(self, source, destination):
+        """Move a file, as a single rename when the sorting folders share a filesystem"""
+        if self._same_fs:
+            try:
+                os.replace(source, destination)
+                return
+            except OSError:
+                pass
+        shutil.move(str(source), str(destination))
+    
+    def _dest_names(self, folder):
+        """File names in a sorting folder, scanned once and then kept up to date"""
+        names = self._dest_name_cache.get(folder)
+        if names is None:
+            with os.scandir(folder) as entries:
+                names = {entry.name for entry in entries}
+            self._dest_name_cache[folder] = names
+        return names
+    
+    def _unique_destination(self, folder, name):
+        """Pick a free file name in folder, appending _1, _2, ... on collisions"""
+        names = self._dest_names(folder)
+        stem, suffix = os.path.splitext(name)
+        candidate = name
+        counter = 0
+        while True:
+            if candidate not in names:
+                # The cached listing can miss files added since it was scanned,
+                # and os.replace would silently overwrite them
+                if not (folder / candidate).exists():
+                    return folder / candidate
+                names.add(candidate)
+            counter += 1
+            candidate = f"{stem}_{counter}{suffix}"
+    
+    def _record_sort(self, category, source, destination, action):
+        """Record a sort in metadata, statistics and undo history (no Tk/FS work)"""
+        self.metadata.setdefault('sorted_images', {})[str(destination)] = {
+            'category': category,
+            'original_path': str(source)
+        }
+        self.save_metadata()
+        
+        self._bump(category)
+        
+        self.history.append({
+            'source': source,
+            'destination': destination,
+            'category': category,
+            'action': action
+        })
+    
     def undo_action(self):
         """Undo last sorting action"""
         if not self.history:
@@ -844,7 +1382,8 @@ class UnifiedPipeline:
         
         if action == 'move':
             if destination.exists():
-                shutil.move(str(destination), str(source))
+                self._move_file(destination, source)
+                self._dest_names(destination.parent).discard(destination.name)
             
             if str(destination) in self.metadata.get('sorted_images', {}):
                 del self.metadata['sorted_images'][str(destination)]
@@ -854,7 +1393,7 @@ class UnifiedPipeline:
                 del self.metadata['sorted_images'][str(source)]
                 self.save_metadata()
         
-        self.stats[category] -= 1
+        self._bump(category, -1)
         
         self.current_index = max(0, self.current_index - 1)
         
@@ -865,6 +1404,7 @@ class UnifiedPipeline:
     def show_completion(self):
         """Show completion message"""
         self.is_running = False
+        self.save_metadata_final()
         self.start_button.config(state=tk.NORMAL, text="▶ START PIPELINE", bg='#4CAF50')
         
         self.image_label.config(
@@ -876,24 +1416,26 @@ class UnifiedPipeline:
         self.info_label.config(text="All characters sorted!")
         self.update_progress("Pipeline complete!")
         
-        remaining_in_discard = 0
-        for img_path in self.discarded_folder.glob("*.png"):
-            if str(img_path) not in self.metadata.get('sorted_images', {}):
-                remaining_in_discard += 1
+        # Keys are str(Path) of files under discarded_folder, which is exactly DirEntry.path
+        sorted_keys = self.metadata.get('sorted_images', {})
+        with os.scandir(self.discarded_folder) as it:
+            remaining_in_discard = sum(
+                1 for e in it
+                if e.name.endswith('.png') and e.path not in sorted_keys
+            )
         
-        total_sorted = sum([self.stats[k] for k in ['Bo', 'Gau', 'Others', 'Discarded']])
         summary = (
             f"Pipeline Complete!\n\n"
-            f"Memes processed: {self.stats['memes_processed']}\n"
-            f"Memes downloaded: {self.stats['memes_downloaded']}\n"
-            f"Memes skipped: {self.stats['memes_skipped']}\n"
-            f"Total characters extracted: {self.stats.get('total_characters', 0)}\n\n"
+            f"Memes processed: {self.n_memes_processed}\n"
+            f"Memes downloaded: {self.n_memes_downloaded}\n"
+            f"Memes skipped: {self.n_memes_skipped}\n"
+            f"Total characters extracted: {self.n_total_characters}\n\n"
             f"Characters sorted:\n"
-            f"  Bo: {self.stats['Bo']}\n"
-            f"  Gau: {self.stats['Gau']}\n"
-            f"  Others: {self.stats['Others']}\n"
-            f"  Discarded: {self.stats['Discarded']}\n\n"
-            f"Total sorted: {total_sorted}\n"
+            f"  Bo: {self.n_bo}\n"
+            f"  Gau: {self.n_gau}\n"
+            f"  Others: {self.n_others}\n"
+            f"  Discarded: {self.n_discarded}\n\n"
+            f"Total sorted: {self.n_total_sorted}\n"
             f"Remaining unsorted: {remaining_in_discard}"
         )
         
@@ -903,9 +1445,20 @@ class UnifiedPipeline:
         """Stop the pipeline"""
         if messagebox.askyesno("Stop", "Stop the pipeline?"):
             self.is_running = False
+            self.save_metadata_final()
             self.start_button.config(state=tk.NORMAL, text="▶ START PIPELINE", bg='#4CAF50')
             self.update_progress("Pipeline stopped by user")
     
+    def on_close(self):
+        """Window closed: cancel pending downloads so the pool threads can exit, then quit"""
+        self._closing.set()
+        self.is_running = False
+        self._cancel_downloads = True
+        
+        # Drop queued captioning runs; a running one stops at its next batch
+        self._caption_worker.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+    
     # Captioning functions
     def start_captioning(self):
         """Start the captioning process in background"""
@@ -914,43 +1467,97 @@ class UnifiedPipeline:
         # Disable button
         self.caption_button.config(state=tk.DISABLED, text="Generating...", bg='#757575')
         
-        # Run in thread
-        thread = Thread(target=self.run_captioning, daemon=True)
-        thread.start()
+        # Run on the caption worker
+        self._caption_worker.submit(self.run_captioning)
     
     def run_captioning(self):
         """Run the captioning on Bo and Gau folders"""
+        caption_cache = None
         try:
-            # Initialize captioner
-            self.captioner = ImageCaptioner(threshold=0.35)
+            # Model is loaded on the first run only
+            captioner = self._get_captioner()
+            
+            # Opened on this thread: sqlite connections are not shared across threads
+            caption_cache = ResultCache(self.sorted_dir / "caption_cache.db")
+            
+            # Stream tags to the UI a batch at a time (one Tk round-trip per batch)
+            def on_images_done(rows):
+                if not self._closing.is_set():
+                    self.root.after(0, self._append_caption_rows, rows)
             
             # Caption Bo folder
-            bo_results = self.captioner.caption_batch(self.bo_folder, pattern="*.png")
+            bo_results = captioner.caption_batch(
+                self.bo_folder, pattern="*.png", cache=caption_cache,
+                progress_callback=on_images_done, cancel_event=self._closing
+            )
             
             # Caption Gau folder
-            gau_results = self.captioner.caption_batch(self.gau_folder, pattern="*.png")
+            gau_results = captioner.caption_batch(
+                self.gau_folder, pattern="*.png", cache=caption_cache,
+                progress_callback=on_images_done, cancel_event=self._closing
+            )
+            
+            # Window was closed, there is no UI left to update
+            if self._closing.is_set():
+                return
             
-            # Combine results
-            self.caption_results = {**bo_results, **gau_results}
+            # Combine results (built locally, the Tk thread may be reading the current ones)
+            new_results = {**bo_results, **gau_results}
             
             # Update statistics
-            self.tag_stats = self.captioner.get_tag_statistics(self.caption_results)
+            new_stats = captioner.get_tag_statistics(new_results)
             
-            # Update UI
-            self.root.after(0, self.update_caption_ui)
+            # Publish and update UI on the Tk thread
+            self.root.after(0, self._commit_caption_results, new_results, new_stats)
             
             messagebox.showinfo(
                 "Captioning Complete",
-                f"Successfully captioned {len(self.caption_results)} images!\n"
-                f"Total unique tags: {len(self.tag_stats)}"
+                f"Successfully captioned {len(new_results)} images!\n"
+                f"Total unique tags: {len(new_stats)}"
             )
             
         except Exception as e:
-            messagebox.showerror("Captioning Error", f"An error occurred: {e}")
             import traceback
             traceback.print_exc()
+            if not self._closing.is_set():
+                messagebox.showerror("Captioning Error", f"An error occurred: {e}")
         finally:
-            self.caption_button.config(state=tk.NORMAL, text="🏷️ Generate Captions (Bo + Gau)", bg='#2196F3')
+            if caption_cache is not None:
+                caption_cache.close()
+            if not self._closing.is_set():
+                self.caption_button.config(state=tk.NORMAL, text="🏷️ Generate Captions (Bo + Gau)", bg='#2196F3')
+    
+    def _append_caption_rows(self, rows):
+        """Merge a batch of streamed (image path, tags) results, redrawing the tag list periodically (Tk thread)"""
+        for img_path, tags in rows:
+            old_tags = self.caption_results.get(img_path, [])
+            self.tag_stats.subtract(old_tags)
+            for tag in old_tags:
+                if self.tag_stats[tag] <= 0:
+                    del self.tag_stats[tag]
+            
+            self.caption_results[img_path] = tags
+            self.tag_stats.update(tags)
+        self._sorted_tags = None
+        
+        self._captions_since_redraw += len(rows)
+        if self._captions_since_redraw >= self.CAPTION_REDRAW_EVERY:
+            self._captions_since_redraw = 0
+            self._redraw_tag_listbox()
+    
+    def _commit_caption_results(self, results, stats):
+        """Swap in a finished captioning run and redraw (Tk thread)"""
+        self.caption_results, self.tag_stats = results, stats
+        self._sorted_tags = None
+        self._captions_since_redraw = 0
+        self.update_caption_ui()
+    
+    def _get_captioner(self):
+        """Return the shared ImageCaptioner, loading the tagger model on first use"""
+        with self._captioner_lock:
+            if self.captioner is None:
+                self.captioner = ImageCaptioner(threshold=0.35)
+            return self.captioner
     
     def update_caption_ui(self):
         """Update the caption tab UI with results"""
@@ -959,37 +1566,53 @@ class UnifiedPipeline:
     
     def populate_tag_list(self, filter_text=""):
         """Populate the tag listbox with statistics"""
-        self.tag_listbox.delete(0, tk.END)
-        
         if not self.tag_stats:
-            self.tag_listbox.insert(tk.END, "No tags yet. Generate captions first.")
+            self._listbox_tags = []
+            self._tag_listvar.set(("No tags yet. Generate captions first.",))
             return
         
-        # Filter and sort
-        filtered_tags = [
-            (tag, count) for tag, count in self.tag_stats.most_common()
-            if filter_text.lower() in tag.lower()
-        ]
-        
-        # Add to listbox
-        for tag, count in filtered_tags:
-            display = f"{tag:<40} ({count:>3})"
-            self.tag_listbox.insert(tk.END, display)
+        # Sort and format once, filtering then only compares strings
+        if self._sorted_tags is None:
+            self._sorted_tags = [
+                (tag, tag.lower(), f"{tag:<40} ({count:>3})")
+                for tag, count in self.tag_stats.most_common()
+            ]
+        
+        # A filter containing the previous one can only narrow its matches,
+        # so rescan just those while the sorted list is unchanged
+        filter_text = filter_text.lower()
+        candidates = self._sorted_tags
+        if self._last_filter is not None:
+            source, last_text, last_shown = self._last_filter
+            if source is self._sorted_tags and last_text in filter_text:
+                candidates = last_shown
+        
+        shown = [entry for entry in candidates if filter_text in entry[1]]
+        self._last_filter = (self._sorted_tags, filter_text, shown)
+        self._listbox_tags = [tag for tag, _, _ in shown]
+        
+        # Replace all rows at once
+        self._tag_listvar.set(tuple(row for _, _, row in shown))
     
     def filter_tags(self):
-        """Filter tags based on search input"""
-        filter_text = self.tag_filter_var.get()
-        self.populate_tag_list(filter_text)
+        """Filter tags based on search input, once typing pauses"""
+        if self._filter_after_id is not None:
+            self.root.after_cancel(self._filter_after_id)
+        self._filter_after_id = self.root.after(self.FILTER_DEBOUNCE_MS, self._apply_tag_filter)
+    
+    def _apply_tag_filter(self):
+        """Repopulate the tag list with the current filter text"""
+        self._filter_after_id = None
+        self.populate_tag_list(self.tag_filter_var.get())
     
     def on_tag_select(self, event):
         """Handle tag selection"""
         selection = self.tag_listbox.curselection()
-        if not selection:
+        if not selection or selection[0] >= len(self._listbox_tags):
             return
         
         # Get selected tag
-        item = self.tag_listbox.get(selection[0])
-        tag = item.split('(')[0].strip()
+        tag = self._listbox_tags[selection[0]]
         
         # Show images with this tag
         print(f"Selected tag: {tag}")
@@ -997,13 +1620,12 @@ class UnifiedPipeline:
     def remove_selected_tag(self):
         """Remove the selected tag from all images"""
         selection = self.tag_listbox.curselection()
-        if not selection:
+        if not selection or selection[0] >= len(self._listbox_tags):
             messagebox.showwarning("No Selection", "Please select a tag to remove")
             return
         
         # Get selected tag
-        item = self.tag_listbox.get(selection[0])
-        tag = item.split('(')[0].strip()
+        tag = self._listbox_tags[selection[0]]
         count = self.tag_stats[tag]
         
         # Confirm
@@ -1013,56 +1635,147 @@ class UnifiedPipeline:
         ):
             return
         
-        # Remove from Bo folder
-        modified_bo = self.captioner.remove_tag_from_all(tag, self.bo_folder)
+        # Remove from every Bo/Gau image that has it
+        images_with_tag = [
+            img_path for img_path, tags in self.caption_results.items() if tag in tags
+        ]
+        sorted_tags = self._sorted_tags
+        writes = {}
+        for img_path in images_with_tag:
+            new_tags = [t for t in self.caption_results[img_path] if t != tag]
+            writes[img_path] = self._io_pool.submit(
+                ImageCaptioner.save_caption_file, Path(img_path).with_suffix('.txt'), new_tags
+            )
         
-        # Remove from Gau folder
-        modified_gau = self.captioner.remove_tag_from_all(tag, self.gau_folder)
+        # Caption files are rewritten in parallel; once the last one is done,
+        # the bookkeeping runs on the Tk thread without blocking it meanwhile
+        self.remove_tag_button.config(state=tk.DISABLED)
+        if not writes:
+            self._finish_tag_removal(tag, writes, sorted_tags)
+            return
         
-        total_modified = modified_bo + modified_gau
+        pending = [len(writes)]
+        pending_lock = Lock()
         
-        # Refresh stats
-        self.refresh_tag_stats()
+        def on_write_done(_future):
+            with pending_lock:
+                pending[0] -= 1
+                last = pending[0] == 0
+            if last:
+                self.root.after(0, self._finish_tag_removal, tag, writes, sorted_tags)
         
+        for future in writes.values():
+            future.add_done_callback(on_write_done)
+    
+    def _finish_tag_removal(self, tag, writes, sorted_tags):
+        """Apply a finished bulk tag removal to the in-memory state, only for files actually rewritten (Tk thread)"""
+        self.remove_tag_button.config(state=tk.NORMAL)
+        
+        # The tag list may have been rebuilt while the files were written
+        sorted_tags_current = self._sorted_tags is sorted_tags
+        
+        total_modified = 0
+        for img_path, future in writes.items():
+            if future.exception() is not None:
+                print(f"✗ Error writing caption file for {img_path}: {future.exception()}")
+                continue
+            self._apply_tag_delta(img_path, set(), {tag}, write=False)
+            total_modified += 1
+        
+        # If every write succeeded only this tag's count changed (to zero),
+        # so drop its row rather than re-sorting
+        if sorted_tags_current and sorted_tags is not None and tag not in self.tag_stats:
+            self._sorted_tags = [entry for entry in sorted_tags if entry[0] != tag]
+        
+        # Redraw once, after all edits
+        self.tag_listbox.after_idle(self._redraw_tag_listbox)
+        
+        failed = len(writes) - total_modified
         messagebox.showinfo(
             "Tag Removed",
             f"Removed tag '{tag}' from {total_modified} caption files"
+            + (f"\n{failed} caption files could not be written and still have it" if failed else "")
         )
     
+    def _apply_tag_delta(self, image_path, added, removed, write=True):
+        """
+        Add/remove tags of one image, keeping its caption file, caption_results
+        and tag_stats in sync without rescanning
+        
+        Args:
+            image_path: Path of the captioned image
+            added: Set of tags to add
+            removed: Set of tags to remove
+            write: Rewrite the caption file now (False leaves it to the caller)
+            
+        Returns:
+            The image's new tag list, or None if nothing changed
+        """
+        image_path = str(image_path)
+        tags = self.caption_results.get(image_path, [])
+        
+        removed = removed & set(tags)
+        added = added - set(tags)
+        if not added and not removed:
+            return None
+        
+        new_tags = [t for t in tags if t not in removed] + sorted(added)
+        if write:
+            ImageCaptioner.save_caption_file(Path(image_path).with_suffix('.txt'), new_tags)
+        self.caption_results[image_path] = new_tags
+        
+        self.tag_stats.update(added)
+        self.tag_stats.subtract(removed)
+        for tag in removed:
+            if self.tag_stats[tag] <= 0:
+                del self.tag_stats[tag]
+        self._sorted_tags = None
+        
+        return new_tags
+    
+    def _redraw_tag_listbox(self):
+        """Repopulate the tag list with the current filter"""
+        self.populate_tag_list(self.tag_filter_var.get())
+    
     def refresh_tag_stats(self):
         """Refresh tag statistics from caption files"""
-        if not self.captioner:
-            self.captioner = ImageCaptioner(threshold=0.35)
-        
-        self.caption_results = {}
-        
-        # Load from Bo
-        for txt_file in self.bo_folder.glob("*.txt"):
-            tags = self.captioner.load_caption_file(txt_file)
-            img_path = txt_file.with_suffix('.png')
-            if img_path.exists():
-                self.caption_results[str(img_path)] = tags
-        
-        # Load from Gau
-        for txt_file in self.gau_folder.glob("*.txt"):
-            tags = self.captioner.load_caption_file(txt_file)
-            img_path = txt_file.with_suffix('.png')
-            if img_path.exists():
-                self.caption_results[str(img_path)] = tags
+        # Load from Bo and Gau
+        self.caption_results = dict(chain.from_iterable(
+            self._iter_tags_for_dir(folder) for folder in (self.bo_folder, self.gau_folder)
+        ))
         
         # Update stats
-        self.tag_stats = self.captioner.get_tag_statistics(self.caption_results)
+        self.tag_stats = Counter(chain.from_iterable(self.caption_results.values()))
+        self._sorted_tags = None
         
         # Update UI
         self.populate_tag_list()
     
+    def _iter_tags_for_dir(self, folder):
+        """Yield (image path, tags) for each captioned PNG, re-reading only changed caption files"""
+        images, captions = scan_caption_pairs(folder)
+        
+        for stem in captions.keys() & images.keys():
+            entry = captions[stem]
+            img_name = images[stem].name
+            
+            st = entry.stat()
+            tags = _load_tags_cached(entry.path, st.st_mtime_ns, st.st_size)
+            
+            yield str(folder / img_name), list(tags)
+    
     def load_images_for_viewer(self):
         """Load images for the viewer combobox"""
         dirname = self.view_dir_var.get()
         folder = self.bo_folder if dirname == "Bo" else self.gau_folder
         
         # Get all PNG files
-        image_files = sorted([f.name for f in folder.glob("*.png")])
+        with os.scandir(folder) as it:
+            image_files = [
+                e.name for e in it
+                if e.name.endswith('.png') and e.is_file(follow_symlinks=False)
+            ]
+        image_files.sort()
         
         self.image_combo['values'] = image_files
         
@@ -1081,27 +1794,24 @@ class UnifiedPipeline:
         img_name = self.image_combo.get()
         img_path = folder / img_name
         
-        if not img_path.exists():
+        try:
+            mtime_ns = img_path.stat().st_mtime_ns
+        except FileNotFoundError:
             return
         
         # Load and display image
         try:
-            img = Image.open(img_path)
-            
-            max_size = (300, 300)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            frame = _viewer_frame_of(str(img_path), mtime_ns, self.viewer_size)
             
-            photo = ImageTk.PhotoImage(img)
-            self.preview_label.config(image=photo, text="")
-            self.preview_label.image = photo
+            slot = self._viewer_slots[self._viewer_slot_idx]
+            slot.paste(frame)
+            self.preview_label.config(image=slot, text="")
+            self._viewer_slot_idx ^= 1
         except Exception as e:
             print(f"Error loading preview: {e}")
         
-        # Load and display tags
-        if not self.captioner:
-            self.captioner = ImageCaptioner(threshold=0.35)
-        
-        tags = self.captioner.get_image_tags(img_path)
+        # Load and display tags (caption files only, no model needed)
+        tags = ImageCaptioner.get_image_tags(img_path)
         
         self.tags_text.delete('1.0', tk.END)
         if tags:
@@ -1113,6 +1823,7 @@ class UnifiedPipeline:
         """Run the application"""
         self.create_ui()
         self.root.mainloop()
+        self.save_metadata_final()
 
 
 if __name__ == "__main__":